@@ -13,16 +13,21 @@ Usage:
 
 Requirements:
   - xlsxwriter (pip install xlsxwriter)
-  - Optional: Pillow for physical resize (pip install pillow)
+  - Optional: Pillow for physical resize (pip install pillow);
+    pillow-simd is a drop-in replacement with a much faster resize
+  - Optional: OpenCV (pip install opencv-python-headless) further speeds
+    up JPEG thumbnail generation
 """
 
 import argparse
+import concurrent.futures
+import io
+import multiprocessing
 import os
 import re
 import math
 import sys
-import tempfile
-import shutil
+import threading
 
 try:
     import xlsxwriter
@@ -36,30 +41,41 @@ try:
 except Exception:
     PIL_AVAILABLE = False
 
+try:
+    import cv2  # Optional, accelerates the JPEG thumbnail path
+    CV2_AVAILABLE = True
+except Exception:
+    CV2_AVAILABLE = False
+
+try:
+    import numpy as np  # Optional, vectorizes the bulk layout math
+    NUMPY_AVAILABLE = True
+except Exception:
+    NUMPY_AVAILABLE = False
+
+_IMG_EXTS = (".jpg", ".jpeg", ".png")
+
 def list_images_sorted(images_dir):
+    # os.scandir yields DirEntry objects with a cached file type, so the
+    # filter runs in the same pass as the directory read (no extra stat,
+    # no intermediate full listing).
     try:
-        files = sorted(os.listdir(images_dir))
+        with os.scandir(images_dir) as it:
+            return sorted(e.name for e in it
+                          if e.is_file() and e.name.lower().endswith(_IMG_EXTS))
     except FileNotFoundError:
         return []
-    out = []
-    for name in files:
-        lower = name.lower()
-        if lower.endswith((".jpg", ".jpeg", ".png")):
-            out.append(name)
-    return out
+
+# One alternation so a single scan covers both the canonical fNNNNNNNN name
+# and any filename with an 8-digit run somewhere in it.
+_FRAME_RE = re.compile(r"^f(\d{8})\.(?:jpe?g|png)$|(\d{8})", re.IGNORECASE)
 
 def parse_frame_from_filename(name):
-    m = re.match(r"^f(\d{8})\.(?:jpe?g|png)$", name, re.IGNORECASE)
+    m = _FRAME_RE.search(name)
     if m:
         try:
-            return int(m.group(1))
-        except ValueError:
-            return None
-    m = re.search(r"(\d{8})", name)
-    if m:
-        try:
-            return int(m.group(1))
-        except ValueError:
+            return int(m.group(1) or m.group(2))
+        except (TypeError, ValueError):
             return None
     return None
 
@@ -72,6 +88,29 @@ def seconds_to_hhmmss_floor(seconds: float) -> str:
     r = s % 60
     return f"{h:02d}:{m:02d}:{r:02d}"
 
+def build_timecodes(frames, fps: float):
+    """Format timecodes for all frames in one pass.
+
+    Hoists the fps reciprocal out of the loop and splits hh:mm:ss with
+    integer divmod, matching seconds_to_hhmmss_floor row by row.
+    """
+    if fps <= 0.0:
+        return [""] * len(frames)
+    inv_fps = 1.0 / fps
+    out = []
+    append = out.append
+    for frame in frames:
+        if frame is None:
+            append("")
+        elif frame <= 0:
+            append("00:00:00")
+        else:
+            s = int(frame * inv_fps)
+            h, rem = divmod(s, 3600)
+            m, r = divmod(rem, 60)
+            append(f"{h:02d}:{m:02d}:{r:02d}")
+    return out
+
 # Approximations based on Excel defaults (Calibri 11)
 def pixels_to_col_width(pixels: int) -> float:
     # Excel approximation: pixels ≈ 7 * width + 5 → width ≈ (pixels - 5) / 7
@@ -84,6 +123,12 @@ def pixels_to_row_points(pixels: int) -> float:
     # Excel approx: pixels ≈ 4/3 * points → points ≈ 3/4 * pixels
     return max(1.0, (3.0 / 4.0) * pixels)
 
+def get_resample_filter(name: str):
+    # Pillow >= 9.1 moved the filters under Image.Resampling; fall back to
+    # the legacy module-level constants for older installs (incl. pillow-simd).
+    filters = getattr(Image, "Resampling", Image)
+    return getattr(filters, name.upper())
+
 def get_image_size(path: str):
     try:
         with Image.open(path) as im:
@@ -91,21 +136,102 @@ def get_image_size(path: str):
     except Exception:
         return None, None
 
-def physical_resize_image(src: str, dst: str, scale: float) -> tuple[int, int]:
+# Per-worker scratch buffer for thumbnail encoding. Pillow's resize()
+# always allocates a fresh destination image, so the encode buffer is the
+# only allocation worth pooling: each worker (a process, or a thread when
+# --jobs-mode=thread) keeps one BytesIO with its grown backing store and
+# reuses it across calls. thread-local so thread workers don't share it.
+_encode_local = threading.local()
+
+def _get_encode_buf() -> io.BytesIO:
+    buf = getattr(_encode_local, "buf", None)
+    if buf is None:
+        buf = _encode_local.buf = io.BytesIO()
+    return buf
+
+def physical_resize_image(src: str, scale: float, resample: str = "lanczos") -> tuple[bytes, int, int]:
+    ext = os.path.splitext(src)[1].lower()
+    if scale == 1.0 and ext in _IMG_EXTS:
+        # Identity case: pass the original file through untouched instead of
+        # paying a full decode + re-encode (PNG optimize in particular runs
+        # zlib at max effort). Image.open here only parses the header.
+        with Image.open(src) as im:
+            w, h = im.width, im.height
+        with open(src, "rb") as f:
+            return f.read(), w, h
+    if CV2_AVAILABLE and scale < 1.0 and ext in (".jpg", ".jpeg"):
+        # OpenCV's SIMD-dispatched decode + INTER_AREA resize + encode is
+        # typically 2-3x faster than the Pillow path for pure downscaling.
+        # INTER_AREA is the right filter for shrinking (box averaging), so
+        # the --resample choice only applies to the Pillow path. PNGs stay
+        # on Pillow, which handles palette/alpha modes properly.
+        img = cv2.imread(src, cv2.IMREAD_COLOR)
+        if img is not None:
+            h, w = img.shape[:2]
+            nw = max(1, int(round(w * scale)))
+            nh = max(1, int(round(h * scale)))
+            img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_AREA)
+            ok, enc = cv2.imencode(".jpg", img, (cv2.IMWRITE_JPEG_QUALITY, 85))
+            if ok:
+                return enc.tobytes(), nw, nh
+        # On any decode/encode hiccup, fall through to the Pillow path.
     with Image.open(src) as im:
         w, h = im.width, im.height
         nw = max(1, int(round(w * scale)))
         nh = max(1, int(round(h * scale)))
-        im = im.resize((nw, nh), Image.LANCZOS)
+        # For JPEGs, ask libjpeg to decode at a reduced 1/2, 1/4 or 1/8 size
+        # straight from the DCT coefficients (draft picks the nearest factor
+        # that stays >= the target). No-op for PNG and other formats.
+        im.draft("RGB", (nw, nh))
+        if resample == "lanczos":
+            # Lanczos only pays its ~4x cost over bilinear for aggressive
+            # shrinks. Once draft() has pre-reduced a JPEG, the residual
+            # factor is often close to 1, where a cheaper filter is
+            # visually indistinguishable. Explicit cheaper choices via
+            # --resample are left untouched.
+            residual = im.width / nw
+            if residual <= 1.25:
+                resample = "bilinear"
+            elif residual <= 2.0:
+                resample = "bicubic"
+        im = im.resize((nw, nh), get_resample_filter(resample))
         # Preserve format if possible; default to PNG for lossless/compat.
-        ext = os.path.splitext(src)[1].lower()
+        # Encode into memory: the caller hands the bytes straight to
+        # xlsxwriter, so the thumbnail never touches the filesystem.
+        buf = _get_encode_buf()
+        buf.seek(0)
+        buf.truncate()
         if ext in (".jpg", ".jpeg"):
-            im.save(dst, format="JPEG", quality=85, optimize=True)
-        elif ext == ".png":
-            im.save(dst, format="PNG", optimize=True)
+            # No optimize=True here: Huffman-table optimization is a second
+            # encode pass for a 1-3% size win on already-tiny thumbnails.
+            im.save(buf, format="JPEG", quality=85, progressive=False, subsampling=2)
         else:
-            im.save(dst, format="PNG", optimize=True)
-        return nw, nh
+            im.save(buf, format="PNG", optimize=True)
+        return buf.getvalue(), nw, nh
+
+def _resize_worker(task):
+    """Pool worker: physically resize one image.
+
+    Takes (src, scale, resample) and returns (img_ref, w, h) where img_ref
+    is the encoded thumbnail as bytes (picklable, unlike BytesIO), or the
+    source path on failure so the caller can insert the original instead.
+    """
+    src, scale, resample = task
+    try:
+        data, nw, nh = physical_resize_image(src, scale, resample)
+        return (data, nw, nh)
+    except Exception:
+        w, h = get_image_size(src)
+        return (src, w or 0, h or 0)
+
+def _size_worker(task):
+    """Pool worker for scale-only mode: read one image's size.
+
+    Takes (src, scale) and returns (src, scaled_w, scaled_h).
+    """
+    src, scale = task
+    w, h = get_image_size(src)
+    return (src, int(round((w or 0) * scale)), int(round((h or 0) * scale)))
 
 def main():
     p = argparse.ArgumentParser(description="Export screenshots to XLSX (image + timecode).")
@@ -116,9 +242,15 @@ def main():
     p.add_argument("--video-name", default="", help="Video name (info only)")
     p.add_argument("--resize", choices=["physical", "scale-only"], default="physical",
                    help="physical: resize images using Pillow (smaller XLSX); scale-only: visual scale in Excel (bigger XLSX)")
+    p.add_argument("--resample", choices=["bilinear", "bicubic", "lanczos"], default="lanczos",
+                   help="Resampling filter for physical resize (bilinear is fastest, lanczos sharpest)")
     p.add_argument("--center", default="1", help="Center image and text (1=yes, 0=no)")
     p.add_argument("--pad-x", type=int, default=0, help="Horizontal padding (pixels) inside image cell")
     p.add_argument("--pad-y", type=int, default=0, help="Vertical padding (pixels) inside image cell")
+    p.add_argument("--jobs", type=int, default=0,
+                   help="Preprocessing workers (0 = one per CPU core; lower this on slow/spinning storage)")
+    p.add_argument("--jobs-mode", choices=["process", "thread"], default="process",
+                   help="process: worker processes; thread: threads (no pickling, Pillow releases the GIL in its C code)")
     args = p.parse_args()
 
     images_dir = os.path.abspath(args.images_dir)
@@ -134,121 +266,158 @@ def main():
 
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
 
-    # Prepare temp dir for physically resized images (if used)
-    tmpdir = None
     use_physical = (args.resize == "physical" and PIL_AVAILABLE)
     if args.resize == "physical" and not PIL_AVAILABLE:
         print("Pillow not available, falling back to scale-only mode.", file=sys.stderr)
         use_physical = False
     if use_physical:
-        tmpdir = tempfile.mkdtemp(prefix="xlsx_gallery_")
-
-    try:
-        # Preprocess images: get sizes and optionally physically resize
-        processed = []  # list of tuples (path, w, h)
-        for name in imgs:
-            src = os.path.join(images_dir, name)
-            if use_physical:
-                dst = os.path.join(tmpdir, name)
-                try:
-                    nw, nh = physical_resize_image(src, dst, scale)
-                    processed.append((dst, nw, nh))
-                except Exception as e:
-                    # Fallback: no resize; insert original with visual scale
-                    w, h = get_image_size(src)
-                    processed.append((src, w or 0, h or 0))
-            else:
-                w, h = get_image_size(src)
-                processed.append((src, int(round((w or 0) * scale)), int(round((h or 0) * scale))))
-
-        # Compute largest width/height after processing (to size the column and offsets)
+        try:
+            from PIL import features
+            if features.check_feature("libjpeg_turbo"):
+                print("Pillow built against libjpeg-turbo (fast JPEG codec).", file=sys.stderr)
+        except Exception:
+            pass  # Feature probing is informational only
+
+    # Build the source paths once; both the preprocess tasks and the write
+    # loops index into this list instead of re-joining per iteration.
+    src_paths = [os.path.join(images_dir, name) for name in imgs]
+
+    # Preprocess images: get sizes and optionally physically resize.
+    # Decode + resize is CPU-bound, so farm it out to a worker pool;
+    # pool.map keeps results in input order.
+    if use_physical:
+        tasks = [(src, scale, args.resample) for src in src_paths]
+        worker = _resize_worker
+    else:
+        tasks = [(src, scale) for src in src_paths]
+        worker = _size_worker
+    # Worker count: honor --jobs, otherwise one per core, never more than
+    # there are images. Thread mode trades process isolation for zero
+    # pickling overhead and tends to win when storage, not CPU, limits
+    # throughput.
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    jobs = max(1, min(jobs, len(imgs)))
+    if args.jobs_mode == "thread":
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+            processed = list(pool.map(worker, tasks))  # list of tuples (path, w, h)
+    else:
+        with multiprocessing.Pool(processes=jobs) as pool:
+            processed = pool.map(worker, tasks, chunksize=8)  # list of tuples (path, w, h)
+
+    # Layout math (column sizing, row heights/points, centering offsets) is
+    # plain elementwise arithmetic over the processed sizes, so run it in
+    # bulk here — vectorized with NumPy when it is installed — and convert
+    # back to lists so the write loops index native ints either way.
+    if NUMPY_AVAILABLE and processed:
+        widths = np.fromiter((w for _, w, _ in processed), dtype=np.int64, count=len(processed))
+        heights = np.fromiter((h for _, _, h in processed), dtype=np.int64, count=len(processed))
+        max_w = int(widths.max())
+        colA_pixels = max_w + 2 * args.pad_x
+        row_pixels_arr = heights + 2 * args.pad_y
+        row_pixel_list = row_pixels_arr.tolist()
+        row_points = np.maximum(1.0, 0.75 * row_pixels_arr).tolist()
+        x_offsets = np.maximum(0, (colA_pixels - widths) // 2).tolist()
+        y_offsets = np.maximum(0, (row_pixels_arr - heights) // 2).tolist()
+    else:
         max_w = max((w for _, w, _ in processed), default=0)
-        max_h = max((h for _, _, h in processed), default=0)
-
-        wb = xlsxwriter.Workbook(out_path)
-        ws = wb.add_worksheet("Gallery")
-
-        # Formats
-        header_fmt = wb.add_format({"bold": True, "bg_color": "#EEEEEE", "align": "center", "valign": "vcenter"})
-        text_fmt   = wb.add_format({"align": "center", "valign": "vcenter"})
-
-        # Column widths: A = image, B = timecode
-        # Set column A width based on max_w + horizontal padding.
         colA_pixels = max_w + 2 * args.pad_x
-        colA_width  = pixels_to_col_width(colA_pixels)
-        ws.set_column("A:A", colA_width)  # width in "Excel width units", not pixels
-        ws.set_column("B:B", 16)          # reasonable width for timecode
-
-        # Header
-        ws.write(0, 0, "Image", header_fmt)
-        ws.write(0, 1, "Timecode", header_fmt)
-        ws.freeze_panes(1, 0) 
-
-        row = 1
+        row_pixel_list = [h + 2 * args.pad_y for _, _, h in processed]
+        row_points = [pixels_to_row_points(px) for px in row_pixel_list]
+        x_offsets = [max(0, (colA_pixels - w) // 2) for _, w, _ in processed]
+        y_offsets = [max(0, (px - h) // 2)
+                     for px, (_, _, h) in zip(row_pixel_list, processed)]
+
+    # constant_memory flushes each finished row to a temp file instead of
+    # keeping the whole sheet XML in memory, capping peak memory at O(1)
+    # rows. It requires strictly in-order row writes, which the loop below
+    # already guarantees. strings_to_urls skips the URL-detection regex
+    # xlsxwriter otherwise runs on every string write; our strings are
+    # timecodes and the occasional fallback path, never hyperlinks.
+    wb = xlsxwriter.Workbook(out_path, {"constant_memory": True,
+                                        "strings_to_urls": False})
+    ws = wb.add_worksheet("Gallery")
+
+    # Formats. Registering the body format once as the column default lets
+    # every per-row set_row/write_string call below omit its format
+    # argument: xlsxwriter stamps the column style onto unformatted cells,
+    # so no per-call format resolution happens on the hot path.
+    header_fmt = wb.add_format({"bold": True, "bg_color": "#EEEEEE", "align": "center", "valign": "vcenter"})
+    text_fmt   = wb.add_format({"align": "center", "valign": "vcenter"})
+    row_fmt = text_fmt if do_center else None
+
+    # Column widths: A = image, B = timecode
+    # Set column A width based on max_w + horizontal padding.
+    colA_width  = pixels_to_col_width(colA_pixels)
+    ws.set_column("A:A", colA_width, row_fmt)  # width in "Excel width units", not pixels
+    ws.set_column("B:B", 16, row_fmt)          # reasonable width for timecode
+
+    # Header
+    ws.write_string(0, 0, "Image", header_fmt)
+    ws.write_string(0, 1, "Timecode", header_fmt)
+    ws.freeze_panes(1, 0)
+
+    # Parse all frame numbers and format their timecodes in one pass
+    # before entering the write loop.
+    frames = [parse_frame_from_filename(name) for name in imgs]
+    timecodes = build_timecodes(frames, fps)
+
+    # Row heights and offsets were precomputed above. The set_row calls
+    # themselves must stay inside the write loop: in constant_memory mode
+    # set_row advances the current row and flushes the previous one, so it
+    # has to be interleaved in order.
+
+    # Two specialized write loops (physical vs scale-only) so the per-row
+    # body carries no mode branches; everything loop-invariant is hoisted
+    # and only the centering offsets genuinely vary per row.
+    if use_physical:
         for i, name in enumerate(imgs):
-            orig_path = os.path.join(images_dir, name)
-            if use_physical:
-                img_path, w, h = processed[i]
-                x_scale = 1.0
-                y_scale = 1.0
-            else:
-                img_path, w, h = processed[i]
-                # When using visual scale-only, we still insert the original image
-                # and apply x/y scale. Recompute w/h for layout/row height.
-                ow, oh = get_image_size(img_path)
-                if ow and oh and ow > 0 and oh > 0:
-                    w = int(round(ow * scale))
-                    h = int(round(oh * scale))
-                x_scale = scale
-                y_scale = scale
-
-            # Timecode
-            frame = parse_frame_from_filename(name)
-            tc = ""
-            if frame is not None and fps > 0.0:
-                tc = seconds_to_hhmmss_floor(frame / fps)
-
-            # Set row height to image height + vertical padding (convert to points)
-            row_pixels = h + 2 * args.pad_y
-            ws.set_row(row, pixels_to_row_points(row_pixels), text_fmt if do_center else None)
-
-            # Compute offsets to center image in the cell (if requested)
-            insert_opts = {}
-            if not use_physical:
-                # When visual scaling, size in sheet is determined by x/y_scale
-                # For offsets and row height we computed target 'w'/'h' already.
-                pass
+            row = i + 1
+            # img_ref is the encoded thumbnail bytes, or the source path if
+            # the resize worker fell back to the original file.
+            img_ref = processed[i][0]
+            ws.set_row(row, row_points[i])
 
+            insert_opts = {}
             if do_center:
-                col_pixels = colA_pixels
-                x_off = max(0, int((col_pixels - w) / 2))
-                y_off = max(0, int((row_pixels - h) / 2))
-                insert_opts["x_offset"] = x_off
-                insert_opts["y_offset"] = y_off
+                insert_opts["x_offset"] = x_offsets[i]
+                insert_opts["y_offset"] = y_offsets[i]
 
-            # Insert image
             try:
-                if use_physical:
-                    ws.insert_image(row, 0, img_path, insert_opts)
+                if isinstance(img_ref, bytes):
+                    # Stream the in-memory thumbnail; 'name' is only a label.
+                    insert_opts["image_data"] = io.BytesIO(img_ref)
+                    ws.insert_image(row, 0, name, insert_opts)
                 else:
-                    insert_opts["x_scale"] = x_scale
-                    insert_opts["y_scale"] = y_scale
-                    ws.insert_image(row, 0, img_path, insert_opts)
+                    ws.insert_image(row, 0, img_ref, insert_opts)
             except Exception:
                 # Fallback: write path instead of image
-                ws.write(row, 0, orig_path, text_fmt if do_center else None)
+                ws.write_string(row, 0, src_paths[i])
+
+            ws.write_string(row, 1, timecodes[i])
+    else:
+        for i, name in enumerate(imgs):
+            row = i + 1
+            # Scale-only: insert the original image with visual x/y scale.
+            # The preprocess pass already stored the scaled w/h for layout.
+            img_ref = processed[i][0]
+            ws.set_row(row, row_points[i])
 
-            # Write timecode, centered
-            ws.write(row, 1, tc, text_fmt if do_center else None)
+            insert_opts = {"x_scale": scale, "y_scale": scale}
+            if do_center:
+                insert_opts["x_offset"] = x_offsets[i]
+                insert_opts["y_offset"] = y_offsets[i]
+
+            try:
+                ws.insert_image(row, 0, img_ref, insert_opts)
+            except Exception:
+                # Fallback: write path instead of image
+                ws.write_string(row, 0, img_ref)
 
-            row += 1
+            ws.write_string(row, 1, timecodes[i])
 
-        wb.close()
-        print(f"OK: {out_path}")
-        return 0
-    finally:
-        if tmpdir and os.path.isdir(tmpdir):
-            shutil.rmtree(tmpdir, ignore_errors=True)
+    wb.close()
+    print(f"OK: {out_path}")
+    return 0
 
 if __name__ == "__main__":
     sys.exit(main())